@@ -1,9 +1,18 @@
 from __future__ import annotations
+import codecs
+import io
+import os
 import subprocess
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from itertools import chain
+from typing import BinaryIO, Iterable, Iterator
 import fnmatch
-import sys, argparse
-from typing import Union
+import functools
+import re
+import argparse
 
 # --- CONFIGURATION ---
 
@@ -17,8 +26,28 @@ include_patterns: set[str] = {
     "*.md", "*.txt", "*.sh", "*.env.example"
 }
 
-# Pre-compiled tuple for faster extension checking
-include_extensions = tuple(p[1:] for p in include_patterns if p.startswith("*."))
+# fnmatch case-folds through os.path.normcase, which only matters on Windows.
+case_insensitive_names = os.name == "nt"
+
+# Plain "*.ext" patterns are split out into a tuple for a C-level endswith check;
+# only genuinely wildcarded patterns need the regex fallback.
+plain_patterns = {
+    p for p in include_patterns
+    if p.startswith("*.") and not any(c in p[1:] for c in "*?[")
+}
+include_extensions = tuple(
+    p[1:].lower() if case_insensitive_names else p[1:] for p in plain_patterns
+)
+complex_patterns = include_patterns - plain_patterns
+include_regex = re.compile(
+    "|".join(fnmatch.translate(p) for p in complex_patterns),
+    re.IGNORECASE if case_insensitive_names else 0,
+) if complex_patterns else None
+
+# Files larger than this many bytes are listed but their contents are replaced by a
+# placeholder; set to None to dump every file in full. They are still probed while
+# listing, so an oversized binary stays out of the tree like any other.
+max_file_size: int | None = 1024 * 1024
 
 # Explicitly excluded filenames
 excluded_names: set[str] = {".env", "secrets.json"}
@@ -433,116 +462,347 @@ PROMPTS = {
     "feature_architect": feature_architect_prompt,
 }
 
-# --- TYPE DEFINITIONS ---
-# ✅ Use the backward-compatible Union type
-Tree = dict[str, Union["Tree", None]]
+# Fixed section headings of the dump, encoded once.
+STRUCTURE_HEADER = "\n## 📁 File Structure\n\n".encode("utf-8")
+CONTENTS_HEADER = "\n## 📄 File Contents\n\n".encode("utf-8")
+
+# Paths from os.fsdecode may hold surrogates for bytes that aren't UTF-8;
+# they are written as escapes instead of failing the whole dump.
+PATH_ERRORS = "backslashreplace"
+
+# Closes each file's fenced block in the dump.
+FILE_FOOTER = b"\n```\n\n"
+
+# Thread count for the blocking file probes and reads, which release the GIL.
+IO_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# How many files may be read ahead of the output writer.
+READ_AHEAD = 64
+
+# Output buffer size; the many small header/footer writes coalesce into few syscalls.
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# Files above this size are streamed in STREAM_CHUNK_SIZE pieces instead of read whole,
+# so read-ahead never holds more than a bounded amount of any one file. It sits below
+# the default max_file_size, so files between the two are streamed rather than skipped.
+STREAM_THRESHOLD = 256 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Every ASCII character str.rstrip() treats as whitespace, including the \x1c-\x1f
+# separators that bytes.rstrip() would keep, so ASCII content can be trimmed undecoded.
+ASCII_WHITESPACE = b"\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f "
+
+# Bytes read when sniffing a file for null bytes.
+PROBE_SIZE = 2048
+
+# Small files read in full by is_binary, keyed by path, so the content pass skips a reopen.
+probe_cache: dict[str, bytes] = {}
 
 # --- HELPER FUNCTIONS ---
 
 def get_unique_filename(base_name: str) -> Path:
     """Generates a unique filename like 'name.txt', 'name (1).txt', etc."""
-    output_path = project_root / f"{base_name}.txt"
+    # One directory listing instead of a stat per candidate. Names are casefolded
+    # so a case-insensitive filesystem can never be tricked into an overwrite.
+    taken = {name.casefold() for name in os.listdir(project_root)}
+    file_name = f"{base_name}.txt"
     counter = 1
-    while output_path.exists():
-        output_path = project_root / f"{base_name} ({counter}).txt"
+    while file_name.casefold() in taken:
+        file_name = f"{base_name} ({counter}).txt"
         counter += 1
-    return output_path
+    return project_root / file_name
 
-def is_binary(path: Path) -> bool:
+def is_binary(path: str) -> bool:
     """A simple heuristic to check if a file is binary by checking for null bytes."""
+    # Raw fd access skips the buffered file object (and its extra fstat) per probe.
     try:
-        with open(path, "rb") as f:
-            return b'\0' in f.read(2048)
-    except IOError:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            head = os.read(fd, PROBE_SIZE)
+        finally:
+            os.close(fd)
+    except OSError:
         return True
+    if b'\0' in head:
+        return True
+    # A short read means the probe already holds the whole file; keep it for the dump.
+    if len(head) < PROBE_SIZE:
+        probe_cache[path] = head
+    return False
+
+def normalize_text(data: bytes) -> bytes:
+    """Converts raw file bytes to UTF-8 with universal newlines and trailing whitespace stripped."""
+    if b"\r" not in data:
+        # Pure-ASCII content needs no decoding: stripping ASCII_WHITESPACE removes
+        # exactly what str.rstrip would, so it can be written out as-is.
+        if data.isascii():
+            return data.rstrip(ASCII_WHITESPACE)
+        # Valid UTF-8 is already in its output encoding; decoding is only needed
+        # to validate it and to measure the (possibly non-ASCII) whitespace tail.
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+        else:
+            tail = text[len(text.rstrip()):]
+            return data[:len(data) - len(tail.encode("utf-8"))] if tail else data
+    text = data.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+    return text.rstrip().encode("utf-8")
+
+def stream_normalized(src: BinaryIO, path: str) -> Iterator[bytes]:
+    """Streams a large file as normalized UTF-8 chunks, like normalize_text but in pieces."""
+    # Chunks stay raw bytes while they are pure ASCII without carriage returns.
+    # The first chunk that isn't switches to incremental decoding for the rest;
+    # nothing can straddle that boundary, since every earlier byte was plain ASCII.
+    decoder: io.IncrementalNewlineDecoder | None = None
+    # Only the current run of whitespace is held back, since it is dropped
+    # if it turns out to be the end of the file.
+    held = b""
+    try:
+        while True:
+            chunk = src.read(STREAM_CHUNK_SIZE)
+            if decoder is None and chunk.isascii() and b"\r" not in chunk:
+                if not chunk:
+                    break
+                body = chunk.rstrip(ASCII_WHITESPACE)
+                if body:
+                    yield held + body
+                    held = chunk[len(body):]
+                else:
+                    held += chunk
+                continue
+
+            if decoder is None:
+                utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                decoder = io.IncrementalNewlineDecoder(utf8, translate=True)
+            text = decoder.decode(chunk, final=not chunk)
+            body = text.rstrip()
+            if body:
+                yield held + body.encode("utf-8")
+                held = text[len(body):].encode("utf-8")
+            else:
+                held += text.encode("utf-8")
+            if not chunk:
+                break
+    except OSError as e:
+        yield f"\n<Could not finish reading file {path}: {e}>".encode("utf-8", PATH_ERRORS)
+    finally:
+        src.close()
+
+def render_file_block(path: str) -> Iterable[bytes]:
+    """Builds the chunks of one file's section in the dump, or an error note if unreadable."""
+    header = f"### {path}\n```\n".encode("utf-8", PATH_ERRORS)
+    cached = probe_cache.pop(path, None)
+    if cached is not None:
+        return (header, normalize_text(cached), FILE_FOOTER)
 
-def is_valid_file(path: Path) -> bool:
-    """Checks if a file should be included in the output based on config."""
-    # A more direct check for common extensions, fallback for complex patterns
-    if not (
-        path.name.endswith(include_extensions) or
-        any(fnmatch.fnmatch(path.name, pat) for pat in include_patterns)
-    ):
-        return False
-
-    if is_binary(path):
-        return False
-    return True
-
-def build_tree(paths: list[Path]) -> Tree:
-    """Builds a nested dictionary representing the file structure."""
-    tree: Tree = {}
-    for path in paths:
-        d = tree
-        # Use path.parts to build the nested structure
-        for part in path.parts[:-1]:
-            d = d.setdefault(part, {})
-        d[path.parts[-1]] = None
-    return tree
-
-def render_tree(tree: Tree, prefix: str = "") -> list[str]:
-    """Renders a directory tree, sorting files before directories at each level."""
-    lines: list[str] = []
-    # Use an inline lambda for sorting instead of a separate helper function
-    items = sorted(
-        tree.items(),
-        key=lambda item: (isinstance(item[1], dict), item[0])
-    )
-
-    for i, (name, subtree) in enumerate(items):
-        is_last = i == len(items) - 1
-        connector = "└── " if is_last else "├── "
-        lines.append(f"{prefix}{connector}{name}")
-
-        if isinstance(subtree, dict):
-            extension = "    " if is_last else "│   "
-            lines.extend(render_tree(subtree, prefix + extension))
-
-    return lines
-
-# --- MAIN LOGIC ---
+    try:
+        src: BinaryIO | None = open(path, "rb")
+    except OSError as e:
+        return (f"<Could not read file {path}: {e}>\n\n".encode("utf-8", PATH_ERRORS),)
 
-def get_project_files() -> list[Path]:
-    """Gets and filters all relevant project files using Git."""
     try:
-        # Build exclusion pathspecs for Git to handle filtering efficiently
-        git_exclusions = [f":(exclude){d}" for d in excluded_dirs]
-        git_exclusions.extend([f":(exclude){n}" for n in excluded_names])
+        size = os.fstat(src.fileno()).st_size
+        if max_file_size is not None and size > max_file_size:
+            return (header, f"<File too large: {size} bytes, skipped>".encode("utf-8"), FILE_FOOTER)
+        if size > STREAM_THRESHOLD:
+            data = src.read(PROBE_SIZE)
+            if b"\0" not in data:
+                src.seek(0)
+                # The generator takes over the handle and is drained by the writer.
+                stream, src = stream_normalized(src, path), None
+                return chain((header,), stream, (FILE_FOOTER,))
+        else:
+            data = src.read()
+    except OSError as e:
+        return (f"<Could not read file {path}: {e}>\n\n".encode("utf-8", PATH_ERRORS),)
+    finally:
+        if src is not None:
+            src.close()
+
+    # The file may have changed since it was probed, so check its head again.
+    if data.find(b"\0", 0, PROBE_SIZE) != -1:
+        return (f"<Skipped binary file {path}>\n\n".encode("utf-8", PATH_ERRORS),)
+    return (header, normalize_text(data), FILE_FOOTER)
+
+def is_valid_file(path: str) -> bool:
+    """Checks if a file's name matches the include patterns in the config."""
+    return is_valid_name(path.rpartition("/")[2])
+
+def is_valid_name(name: str) -> bool:
+    """Checks a bare file name against the include patterns in the config."""
+    if case_insensitive_names:
+        name = name.lower()
+    if name.endswith(include_extensions):
+        return True
+    return include_regex is not None and matches_complex_pattern(name)
+
+@functools.lru_cache(maxsize=4096)
+def matches_complex_pattern(name: str) -> bool:
+    """Runs the wildcard fallback regex, once per distinct file name."""
+    # Names like "Dockerfile" or "Makefile" repeat across a tree, and a
+    # cache hit is cheaper than re-running the alternation regex.
+    # Only called once is_valid_name has checked that include_regex exists.
+    return include_regex.match(name) is not None
+
+def tree_order_key(parts: tuple[str, ...]) -> str:
+    """Sort key that yields depth-first tree order with files before directories."""
+    # Directory components are prefixed with "\x01" and the file name with "\x00".
+    # Both sort below any printable character, so a plain string comparison puts
+    # files ahead of sibling directories and a directory's whole subtree together.
+    if len(parts) == 1:
+        return "\x00" + parts[0]
+    return "\x01" + "\x01".join(parts[:-1]) + "\x00" + parts[-1]
+
+def render_sorted_paths(paths_parts: list[tuple[str, ...]]) -> Iterator[str]:
+    """Yields newline-terminated directory tree rows from a flat list of split paths."""
+    entries = sorted(paths_parts, key=tree_order_key)
+
+    # In tree order the last child seen under a parent is the one drawn with "└── ".
+    last_child: dict[tuple[str, ...], str] = {}
+    for parts in entries:
+        for depth in range(len(parts)):
+            last_child[parts[:depth]] = parts[depth]
+
+    prefix_parts: list[str] = []
+    prev_dirs: tuple[str, ...] = ()
+    for parts in entries:
+        dirs = parts[:-1]
+        # Directories shared with the previous path are already on screen;
+        # only rows below the common prefix need emitting.
+        common = 0
+        while common < len(prev_dirs) and common < len(dirs) and prev_dirs[common] == dirs[common]:
+            common += 1
+        del prefix_parts[common:]
+
+        for depth in range(common, len(parts)):
+            name = parts[depth]
+            is_last = last_child[parts[:depth]] == name
+            connector = "└── " if is_last else "├── "
+            yield f"{''.join(prefix_parts)}{connector}{name}\n"
+            if depth < len(dirs):
+                prefix_parts.append("    " if is_last else "│   ")
+        prev_dirs = dirs
 
-        cmd = ["git", "ls-files", "-c", "-o", "--exclude-standard"] + git_exclusions
-        git_files_output = subprocess.check_output(cmd).decode().splitlines()
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("❌ Not a Git repository or 'git' command not found.\nMake sure you are in a git-initialized directory.")
-        sys.exit(1)
+# --- MAIN LOGIC ---
 
-    all_paths = (Path(p_str) for p_str in git_files_output)
-    valid_paths = [p for p in all_paths if is_valid_file(p)]
+def walk_project_files() -> list[str]:
+    """Lists included files under the project root without Git, pruning excluded directories."""
+    found: list[str] = []
+    pending = [""]
+    # Names used on every entry are bound locally to skip global lookups in the loop.
+    skip_dirs, skip_names, name_ok = excluded_dirs, excluded_names, is_valid_name
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            with os.scandir(rel_dir or ".") as entries:
+                for entry in entries:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if name not in skip_dirs:
+                            pending.append(f"{rel_dir}{name}/")
+                    elif name not in skip_names and name_ok(name) and entry.is_file():
+                        found.append(rel_dir + name)
+        except OSError:
+            continue
+    return found
+
+def iter_git_files(cmd: list[str]) -> Iterator[str]:
+    """Yields paths from a NUL-separated Git listing as soon as they arrive."""
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+        assert proc.stdout is not None and proc.stderr is not None
+        leftover = b""
+        while chunk := proc.stdout.read1(65536):
+            # The last field may be cut mid-path; carry it into the next chunk.
+            *entries, leftover = (leftover + chunk).split(b"\0")
+            for entry in entries:
+                if entry:
+                    yield os.fsdecode(entry)
+        # Git only writes a short message here, so reading it last cannot block the listing.
+        stderr = proc.stderr.read()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+
+def get_project_files(use_git: bool = True) -> list[str]:
+    """Gets and filters all relevant project files using Git, or a plain walk outside a repo."""
+    # Build pathspecs so Git drops non-matching and excluded files before Python sees them.
+    # is_valid_file() still runs on the result, and is the only filter for the disk walk.
+    glob_magic = "glob,icase" if case_insensitive_names else "glob"
+    git_pathspecs = [f":({glob_magic})**/{p}" for p in include_patterns]
+    # The "**/" prefix makes exclusions apply at any depth, as the disk walk's pruning does.
+    git_pathspecs.extend([f":(exclude,glob)**/{d}/**" for d in excluded_dirs])
+    git_pathspecs.extend([f":(exclude,glob)**/{n}" for n in excluded_names])
+
+    # -z keeps paths unquoted (no core.quotePath escaping) and newline-safe.
+    cmd = ["git", "ls-files", "-z", "-c", "-o", "--exclude-standard", "--"] + git_pathspecs
+
+    # Paths stay as the "/"-separated strings Git prints; Path objects would
+    # re-split them on every .parts/.name access in the filter, sort and tree.
+    # Probes are queued while Git is still listing, so its latency overlaps the I/O.
+    with ThreadPoolExecutor(max_workers=IO_WORKERS) as executor:
+        probes: list[tuple[str, Future[bool]]] = []
+        walk_disk = not use_git
+        if use_git:
+            add_probe, submit, path_ok = probes.append, executor.submit, is_valid_file
+            # An unmerged path is listed once per conflict stage; keep only the first.
+            seen: set[str] = set()
+            mark_seen = seen.add
+            try:
+                for path in iter_git_files(cmd):
+                    if path not in seen and path_ok(path):
+                        mark_seen(path)
+                        add_probe((path, submit(is_binary, path)))
+            except FileNotFoundError:
+                print("ℹ️ 'git' command not found. Listing files from disk instead.")
+                probes = []
+                walk_disk = True
+            except subprocess.CalledProcessError as e:
+                # Only a missing repo falls back: the walk ignores .gitignore, so any
+                # other Git failure (e.g. "dubious ownership") must not leak ignored files.
+                error_message = os.fsdecode(e.stderr).strip()
+                if "not a git repository" not in error_message:
+                    print(f"❌ Error running git ls-files: {error_message or e}")
+                    sys.exit(1)
+                print("ℹ️ Not a Git repository. Listing files from disk instead.")
+                probes = []
+                walk_disk = True
+
+        if walk_disk:
+            # Without Git there is no .gitignore to honour, only the built-in exclusions.
+            probes.extend((path, executor.submit(is_binary, path)) for path in walk_project_files())
+        valid_paths = [path for path, probe in probes if not probe.result()]
 
     # Sort files: root files first, then by full path string.
-    return sorted(valid_paths, key=lambda p: (len(p.parts) > 1, str(p)))
+    valid_paths.sort(key=lambda p: ("/" in p, p))
+    return valid_paths
 
-def write_codebase_to_file(files: list[Path], output_path: Path, prompt_key: str):
+def write_codebase_to_file(files: list[str], output_path: Path, prompt_key: str):
     """Writes the codebase tree and contents to the specified output file."""
-    tree = build_tree(files)
-    tree_str = "\n".join(render_tree(tree))
-
-    with open(output_path, "w", encoding="utf-8", newline="\n") as f:
+    # Interning gives every repeated directory name one shared object, so the
+    # tuple hashing and prefix comparisons in the renderer hit cached hashes
+    # and identity checks instead of rescanning equal strings.
+    intern = sys.intern
+    tree_lines = render_sorted_paths([tuple(map(intern, p.split("/"))) for p in files])
+
+    with open(output_path, "wb", buffering=OUTPUT_BUFFER_SIZE) as f:
+        # Only the selected prompt is encoded; it shares one write with the heading.
         prompt_to_use = PROMPTS.get(prompt_key)
-        if prompt_to_use:
-            f.write(prompt_to_use)
-
-        f.write("\n## 📁 File Structure\n\n")
-        f.write(tree_str + "\n\n")
-        f.write("## 📄 File Contents\n\n")
-        for path in files:
-            try:
-                content = path.read_text(encoding="utf-8", errors="replace")
-                f.write(f"### {path.as_posix()}\n")
-                f.write("```\n")
-                f.write(content.rstrip() + "\n")
-                f.write("```\n\n")
-            except (IOError, UnicodeDecodeError) as e:
-                f.write(f"<Could not read file {path.as_posix()}: {e}>\n\n")
+        preface = prompt_to_use.encode("utf-8") if prompt_to_use else b""
+        f.write(preface + STRUCTURE_HEADER)
+        # Rows are streamed so the whole tree never exists as one string.
+        f.writelines(line.encode("utf-8", PATH_ERRORS) for line in tree_lines)
+        f.write(CONTENTS_HEADER)
+        # Reads run on a thread pool at most READ_AHEAD files ahead of the writer,
+        # which drains the futures in submission order to keep the dump sorted.
+        writelines = f.writelines
+        with ThreadPoolExecutor(max_workers=IO_WORKERS) as executor:
+            pending: deque[Future[Iterable[bytes]]] = deque()
+            for path in files:
+                pending.append(executor.submit(render_file_block, path))
+                if len(pending) >= READ_AHEAD:
+                    writelines(pending.popleft().result())
+            while pending:
+                writelines(pending.popleft().result())
 
 def main():
     """Parses args, coordinates getting files, and writing the output."""
@@ -554,9 +814,14 @@ def main():
         choices=PROMPTS.keys(),
         help='The type of prompt to include in the output file.'
     )
+    parser.add_argument(
+        '--no-git',
+        action='store_true',
+        help='List files straight from disk instead of asking Git (ignores .gitignore).'
+    )
     args = parser.parse_args()
 
-    included_files = get_project_files()
+    included_files = get_project_files(use_git=not args.no_git)
     if not included_files:
         print("No files to dump after filtering.")
         return
@@ -1,4 +1,8 @@
+import argparse
+import os
+import shutil
 import subprocess
+import tempfile
 from pathlib import Path
 import sys
 
@@ -6,112 +10,210 @@ import sys
 
 prompt_header = """Here are the changes implemented based on your last review. Please analyze this diff and let me know if the suggestions were correctly implemented or if any new issues were introduced. """
 
+# The text around the diff, encoded once at import.
+DIFF_HEADER = (prompt_header + "\n---\n\n```diff\n").encode("utf-8")
+DIFF_FOOTER = b"\n```"
+
+# What str.strip() removes from ASCII text.
+ASCII_WHITESPACE = b"\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f "
+
+# Bytes read from the git diff pipe per chunk.
+DIFF_CHUNK_SIZE = 64 * 1024
+# Write buffer for the dump file, so a large diff reaches the disk in few write calls.
+OUTPUT_BUFFER_SIZE = 128 * 1024
+
 # --- HELPER FUNCTIONS ---
 def get_unique_filename(base_path: Path, base_name: str) -> Path:
     """Generates a unique filename in the given base path."""
-    output_path = base_path / f"{base_name}.txt"
+    # Casefolded, so an existing "Diff_Dump.txt" also blocks "diff_dump.txt" on Windows and macOS.
+    taken = {name.casefold() for name in os.listdir(base_path)}
+    file_name = f"{base_name}.txt"
     counter = 1
-    while output_path.exists():
-        output_path = base_path / f"{base_name} ({counter}).txt"
+    while file_name.casefold() in taken:
+        file_name = f"{base_name} ({counter}).txt"
         counter += 1
-    return output_path
+    return base_path / file_name
 
-def get_full_diff() -> tuple[str, Path | None]:
+def write_diff(cmd: list[str], repo_root: Path, output_file: Path, env: dict[str, str] | None = None) -> bool:
+    """
+    Streams the diff from git straight into output_file, wrapped in the prompt header and fence.
+    Returns False, without creating the file, when the diff is empty.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, cwd=repo_root, env=env)
+    out = None
+    # Trailing whitespace is held back until more text follows, so the dump ends as the
+    # stripped diff did without ever holding the whole diff in memory. Only ASCII
+    # whitespace is trimmed, so a last diff line ending in e.g. U+00A0 keeps that character.
+    pending = b""
+    try:
+        with proc.stdout as diff:
+            for chunk in iter(lambda: diff.read1(DIFF_CHUNK_SIZE), b""):
+                if out is None:
+                    chunk = chunk.lstrip(ASCII_WHITESPACE)
+                    if not chunk:
+                        continue
+                    out = open(output_file, "wb", buffering=OUTPUT_BUFFER_SIZE)
+                    out.write(DIFF_HEADER)
+                body = chunk.rstrip(ASCII_WHITESPACE)
+                if body:
+                    out.write(pending)
+                    out.write(body)
+                    pending = chunk[len(body):]
+                else:
+                    pending += chunk
+        if proc.wait():
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        if out is not None:
+            out.close()
+            output_file.unlink(missing_ok=True)
+        raise
+
+    if out is None:
+        return False
+    with out:
+        out.write(DIFF_FOOTER)
+    return True
+
+def find_repo_root() -> Path | None:
     """
-    Gets the uncommitted diff for all changes in the repo.
-    Returns a tuple of (diff_string, repo_root_path).
-    Returns ("", None) on error.
+    Finds the root of the current repo and checks that it has a commit to diff against.
+    Returns None on error.
     """
     try:
-        # 1. Find the repo root.
-        repo_root_cmd = ["git", "rev-parse", "--show-toplevel"]
+        # 1. Find the repo root and check for an initial commit in one call.
+        # The HEAD argument fails with "unknown revision" when there are no commits yet.
+        repo_root_cmd = ["git", "rev-parse", "--show-toplevel", "HEAD"]
         # ✅ Specify UTF-8 encoding
         repo_root_str = subprocess.check_output(
             repo_root_cmd, text=True, encoding="utf-8", stderr=subprocess.PIPE
-        ).strip()
-        repo_root = Path(repo_root_str)
-
-        # 2. Check for initial commit.
-        subprocess.run(
-            ["git", "rev-parse", "--verify", "HEAD"],
-            check=True,
-            capture_output=True,
-            text=True, # ✅ Process stderr as text
-            encoding="utf-8", # ✅ Use UTF-8 for error messages
-            cwd=repo_root
-        )
+        ).splitlines()[0]
+        return Path(repo_root_str)
     except FileNotFoundError:
         print("❌ Git not found. Make sure it's installed and in your PATH.")
-        return "", None
+        return None
     except subprocess.CalledProcessError as e:
         if "unknown revision" in e.stderr:
             print("🤔 No commits found. Cannot create a diff against HEAD.")
             print("   Please make an initial commit first.")
         else:
             print(f"❌ Error finding git repo root: {e.stderr.strip()}")
-        return "", None
+        return None
+
+def dump_full_diff(repo_root: Path | None = None, paths: list[str] | None = None) -> Path | None:
+    """
+    Dumps the uncommitted diff for all changes in the repo.
+    A caller that already knows the repo root can pass it to skip the git rev-parse startup check.
+    If paths are given, only changes under those files or directories are dumped.
+    Returns the path of the written file.
+    Returns None if there is nothing to dump or on error.
+    """
+    if repo_root is None:
+        repo_root = find_repo_root()
+        if repo_root is None:
+            return None
 
     # 1. Determine the output filename BEFORE listing untracked files.
     output_file = get_unique_filename(repo_root, "diff_dump")
 
-    # 2. Get all untracked files.
-    cmd_untracked = ["git", "ls-files", "--others", "--exclude-standard"]
-    # ✅ Specify UTF-8 encoding
-    untracked_output = subprocess.check_output(
-        cmd_untracked, text=True, encoding="utf-8", cwd=repo_root
-    )
-
-    # 3. Filter out the determined output filename from the list.
-    untracked_files_to_add = [
-        f for f in untracked_output.splitlines()
-        if repo_root / f != output_file
-    ]
-
+    diff_env = None
+    temp_dir = None
     try:
-        # 4. Use "intent-to-add" on the FILTERED list.
+        # Paths are relative to the caller's directory, but git runs from the repo root.
+        # Limiting status and diff to them lets git skip the rest of the tree.
+        # relpath raises ValueError for a path on another Windows drive.
+        diff_paths = [Path(os.path.relpath(p, repo_root)).as_posix() for p in paths] if paths else ["."]
+
+        # 2. Get all untracked files, and whether anything changed at all, from one status call.
+        cmd_status = [
+            "git", "--no-optional-locks", "status", "--porcelain=v2", "-z", "--untracked-files=all", "--"
+        ] + diff_paths
+        status_output = subprocess.check_output(cmd_status, cwd=repo_root)
+        # A clean tree skips the add/diff/reset sequence entirely.
+        if not status_output:
+            return None
+
+        # 3. Collect untracked paths, filtering out the determined output filename.
+        # Git prints "/"-separated paths, so a plain string compare replaces a Path per entry.
+        # get_unique_filename() always places the file at the repo root, so its name is its repo path.
+        output_rel = output_file.name
+        untracked_files_to_add = []
+        records = iter(status_output.split(b"\0"))
+        for record in records:
+            if record.startswith(b"? "):
+                path = os.fsdecode(record[2:])
+                if path != output_rel:
+                    untracked_files_to_add.append(path)
+            elif record.startswith(b"2 "):
+                # Rename/copy records carry the original path as an extra NUL-separated field.
+                next(records, None)
+
+        # Paths go to git add on stdin rather than argv, so thousands of new files
+        # cannot exceed the OS command-line limit. --literal-pathspecs keeps names
+        # containing glob characters such as "*" or "[" from matching other files.
+        pathspec_args = ["--pathspec-from-file=-", "--pathspec-file-nul"]
+        pathspec_input = b"\0".join(map(os.fsencode, untracked_files_to_add))
+
+        # 4. Use "intent-to-add" on the FILTERED list, in a throwaway copy of the index.
+        # The user's real index is never modified, so an interrupted run leaves nothing behind.
         if untracked_files_to_add:
-            subprocess.run(["git", "add", "-N"] + untracked_files_to_add, check=True, cwd=repo_root)
-
-        # 5. Get the diff, excluding the output file via pathspec.
-        pathspec = f":(exclude){output_file.relative_to(repo_root)}"
-        # ✅ Specify UTF-8 encoding (This was the line that crashed)
-        full_diff = subprocess.check_output(
-            ["git", "diff", "HEAD", "--", ".", pathspec],
-            text=True,
-            encoding="utf-8",
-            cwd=repo_root
-        ).strip()
-
-        return full_diff, output_file
+            index_path = subprocess.check_output(
+                ["git", "rev-parse", "--git-path", "index"], text=True, encoding="utf-8", cwd=repo_root
+            ).strip()
+            temp_dir = tempfile.mkdtemp(prefix="diff_dump_")
+            temp_index = os.path.join(temp_dir, "index")
+            try:
+                shutil.copyfile(repo_root / index_path, temp_index)
+            except FileNotFoundError:
+                pass  # No index yet; git treats a missing index file as empty.
+            diff_env = {**os.environ, "GIT_INDEX_FILE": temp_index}
+            subprocess.run(
+                ["git", "--literal-pathspecs", "add", "-N"] + pathspec_args,
+                input=pathspec_input, check=True, cwd=repo_root, env=diff_env
+            )
+
+        # 5. Stream the diff to the output file, excluding the file itself via pathspec.
+        # The bytes are copied as git emits them, so non-UTF-8 content can no longer crash the decode.
+        pathspec = f":(exclude){output_rel}"
+        # External diff drivers and forced color would put non-patch output in the dump.
+        cmd_diff = ["git", "diff", "--no-ext-diff", "--no-color", "HEAD", "--"] + diff_paths + [pathspec]
+        if not write_diff(cmd_diff, repo_root, output_file, diff_env):
+            return None
+        return output_file
 
     except subprocess.CalledProcessError as e:
         print("❌ Error running a git command.")
         error_message = e.stderr.strip() if hasattr(e, 'stderr') and e.stderr else str(e)
         print(f"   Git error: {error_message}")
-        return "", None
+        return None
+    except ValueError as e:
+        print("❌ Error running a git command.")
+        print(f"   Path error: {e}")
+        return None
     finally:
-        # 6. VERY IMPORTANT: Clean up by resetting only the files we added.
-        if untracked_files_to_add:
-            subprocess.run(["git", "reset", "--"] + untracked_files_to_add, check=True, cwd=repo_root)
+        # 6. Clean up the temporary index; no git reset is needed.
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
 
 # --- MAIN EXECUTION ---
 def main():
     """Main function to generate and save the diff."""
-    diff_output, output_file_path = get_full_diff()
+    parser = argparse.ArgumentParser(description="Dump uncommitted changes to a text file with a review prompt.")
+    parser.add_argument(
+        'paths',
+        nargs='*',
+        help='Only include changes under these files or directories (default: the whole repo).'
+    )
+    args = parser.parse_args()
+
+    output_file_path = dump_full_diff(paths=args.paths)
 
-    if not diff_output:
+    if output_file_path is None:
         print("No uncommitted changes detected or an error occurred. Nothing to dump.")
         return
 
-    # Now we write the content to the file path we determined earlier.
-    with open(output_file_path, "w", encoding="utf-8", newline="\n") as f:
-        f.write(prompt_header)
-        f.write("\n---\n\n")
-
-        f.write("```diff\n")
-        f.write(diff_output + "\n")
-        f.write("```")
-
     print(f"✅ Full diff dumped to: {output_file_path.name}")
 
 if __name__ == "__main__":